@@ -0,0 +1,68 @@
+from datetime import date, datetime
+from sqlite3 import Connection, Cursor
+
+import journal
+import sync
+
+DATE_FORMAT = "%d/%m/%Y"
+
+
+def setup_history(connection: Connection) -> None:
+    connection.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS progress_history (
+          book_title TEXT NOT NULL,
+          day TEXT NOT NULL,
+          pages INTEGER NOT NULL DEFAULT 0,
+          site_id TEXT NOT NULL,
+
+          PRIMARY KEY (book_title, day, site_id),
+          FOREIGN KEY (book_title) REFERENCES books (title)
+            ON DELETE CASCADE
+            ON UPDATE CASCADE
+        );
+        CREATE INDEX IF NOT EXISTS progress_history_day
+          ON progress_history (day, pages);
+        """
+    )
+    sync.install_triggers(connection)
+    journal.install_triggers(connection)
+
+    # NOTE: Older reads only tell us which days the reading started and ended
+    #  on, so those days are marked as active without any pages to show.
+    cursor = connection.cursor()
+    old_days = cursor.execute(
+        "SELECT book_title, start FROM ongoing_reads "
+        "UNION SELECT book_title, start FROM finished_reads "
+        "UNION SELECT book_title, end_ FROM finished_reads;"
+    ).fetchall()
+    for book_title, day_text in old_days:
+        if day_text:
+            record_activity(cursor, book_title, parse_date(day_text), 0)
+    connection.commit()
+
+
+def parse_date(day_text: str) -> date:
+    return datetime.strptime(day_text, DATE_FORMAT).date()
+
+
+def record_activity(cursor: Cursor, book_title: str, day: date, pages: int) -> None:
+    # NOTE: Pages are added up, so two machines reading the same book on the
+    #  same day would overwrite each other's totals when they sync. Each one
+    #  keeps its own row instead and `daily_activity` adds them together.
+    cursor.execute(
+        "INSERT INTO progress_history VALUES "
+        "(?, ?, ?, (SELECT value FROM sync_state WHERE key = 'site_id')) "
+        "ON CONFLICT (book_title, day, site_id) "
+        "DO UPDATE SET pages = pages + excluded.pages;",
+        (book_title, day.isoformat(), max(pages, 0)),
+    )
+
+
+def daily_activity(cursor: Cursor) -> dict[int, dict[date, int]]:
+    years: dict[int, dict[date, int]] = {}
+    cursor.execute("SELECT day, sum(pages) FROM progress_history GROUP BY day;")
+    for day_text, pages in cursor.fetchall():
+        day = date.fromisoformat(day_text)
+        years.setdefault(day.year, {})[day] = pages
+    return years
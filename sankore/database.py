@@ -0,0 +1,51 @@
+from pathlib import Path
+from sqlite3 import connect, Connection
+from typing import Callable
+
+import activity
+import journal
+import library
+import quotes
+import search
+import sync
+
+INIT_DB_SCRIPT = Path(__file__).joinpath("../../assets/init.sql").resolve()
+
+# NOTE: Only ever append to this list. A database's `user_version` records how
+#  many of these steps it has already been through. It is saved after each
+#  step commits, so every step has to be safe to run a second time.
+MIGRATIONS: list[Callable[[Connection], None]] = [
+    sync.setup_tracking,
+    journal.setup_journal,
+    activity.setup_history,
+    quotes.setup_quotes,
+    search.setup_title_index,
+    library.setup_indexes,
+]
+
+
+def get_cursor(db_file: Path) -> Connection:
+    initialise = not db_file.exists()
+    db_file.touch(exist_ok=True)
+    connection = connect(str(db_file))
+    connection.execute("PRAGMA foreign_keys = ON;")
+    if initialise:
+        create_tables(connection)
+    migrate(connection)
+    return connection
+
+
+def create_tables(connection: Connection) -> None:
+    script_text = INIT_DB_SCRIPT.read_text("utf8")
+    init_cursor = connection.cursor()
+    init_cursor.executescript(script_text)
+    connection.commit()
+    init_cursor.close()
+
+
+def migrate(connection: Connection) -> None:
+    version = connection.execute("PRAGMA user_version;").fetchone()[0]
+    for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        step(connection)
+        connection.execute(f"PRAGMA user_version = {number};")
+        connection.commit()
@@ -1,13 +1,18 @@
 from datetime import date
 from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
-from PySide6.QtCore import QCalendar, QDate, QRegularExpression, Qt
+from PySide6.QtCore import QCalendar, QDate, QRegularExpression, Qt, QTimer
 from PySide6.QtGui import QIcon, QPixmap, QRegularExpressionValidator
 from PySide6 import QtWidgets as widgets
 
 from models import Book
+from search import normalise
+
+BookMatcher = Callable[[str], list[tuple[str, str, float]]]
+# NOTE: Wait for a pause in typing before looking for similar books.
+MATCH_DELAY_MS = 250
 
 get_today = lambda: date.today().strftime("%d/%m/%Y")
 header = lambda text, level=1: f"<h{level}>{text}</h{level}>"
@@ -31,12 +36,22 @@ ASSETS: dict[str, Path] = {
 
 
 class NewBook(widgets.QDialog):
-    def __init__(self, parent: widgets.QWidget) -> None:
+    def __init__(self, parent: widgets.QWidget, find_similar: BookMatcher) -> None:
         super().__init__(parent)
         self.save_changes = False
+        self.find_similar = find_similar
 
         self.setWindowTitle("New Book")
+        self.match_timer = QTimer(self)
+        self.match_timer.setSingleShot(True)
+        self.match_timer.setInterval(MATCH_DELAY_MS)
+        self.match_timer.timeout.connect(self._show_matches)
         self.title_edit = widgets.QLineEdit()
+        self.title_edit.textChanged.connect(lambda _: self.match_timer.start())
+        self.matches_label = widgets.QLabel()
+        self.matches_label.setTextFormat(Qt.RichText)
+        self.matches_label.setWordWrap(True)
+        self.matches_label.hide()
         self.author_edit = widgets.QLineEdit()
         self.page_edit = widgets.QLineEdit()
         self.page_edit.setValidator(NUMBER_VALIDATOR)
@@ -45,12 +60,36 @@ class NewBook(widgets.QDialog):
 
         layout = widgets.QFormLayout(self)
         layout.addRow("Title:", self.title_edit)
+        layout.addRow(self.matches_label)
         layout.addRow("Author:", self.author_edit)
         layout.addRow("No. of pages:", self.page_edit)
         layout.addRow(save_button)
 
+    def _show_matches(self) -> None:
+        matches = self.find_similar(self.title_edit.text())
+        self.matches_label.setText(
+            "<i>Already in your library:</i><br>"
+            + "<br>".join(
+                f"<b>{match_title.title()}</b> by {author.title()}"
+                for match_title, author, _ in matches
+            )
+        )
+        self.matches_label.setVisible(bool(matches))
+
     def accept(self) -> None:
         title, author, *_ = self.result()
+        is_duplicate = any(
+            normalise(title) == normalise(match_title)
+            for match_title, *_ in self.find_similar(title)
+        )
+        if is_duplicate:
+            widgets.QMessageBox.information(
+                self,
+                "Already in your library",
+                f'"{title}" is already in your library, so it won\'t be added again.',
+            )
+            self.title_edit.setFocus()
+            return None
         self.save_changes = bool(title and author)
         return super().done(0)
 
@@ -238,9 +277,10 @@ class QuoteBook(widgets.QDialog):
         self.save_changes = True
         return super().done(0)
 
-    def result(self) -> tuple[str, str, str]:
+    def result(self) -> tuple[str, str, str, str]:
         return (
             self.quote_text.toPlainText().strip(),
+            self.book.title,
             self.book.author,
             get_today(),
         )
@@ -0,0 +1,170 @@
+from contextlib import contextmanager
+from sqlite3 import Connection
+from typing import Iterator, Optional
+
+HISTORY_LIMIT = 100
+JOURNALED_TABLES = (
+    "books",
+    "quotes",
+    "finished_reads",
+    "ongoing_reads",
+    "progress_logs",
+    "progress_history",
+)
+
+
+def setup_journal(connection: Connection) -> None:
+    connection.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS journal_steps (
+          id INTEGER PRIMARY KEY,
+          label TEXT NOT NULL,
+          status TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS journal (
+          seq INTEGER PRIMARY KEY,
+          step_id INTEGER NOT NULL,
+          sql_ TEXT NOT NULL,
+
+          FOREIGN KEY (step_id) REFERENCES journal_steps (id)
+            ON DELETE CASCADE
+        );
+        CREATE INDEX IF NOT EXISTS journal_step_id ON journal (step_id);
+        """
+    )
+    install_triggers(connection)
+    connection.commit()
+
+
+def install_triggers(connection: Connection) -> None:
+    for table in JOURNALED_TABLES:
+        columns = [row[1] for row in connection.execute(f"PRAGMA table_info({table});")]
+        # NOTE: Skip tables that a later migration has yet to create.
+        if not columns:
+            continue
+        old_values = " || ',' || ".join(f"quote(OLD.{col})" for col in columns)
+        old_assignments = " || ',' || ".join(
+            f"'{col}=' || quote(OLD.{col})" for col in columns
+        )
+        undo_insert = f"'DELETE FROM {table} WHERE rowid=' || NEW.rowid"
+        undo_update = (
+            f"'UPDATE {table} SET rowid=' || OLD.rowid || ',' || "
+            f"{old_assignments} || ' WHERE rowid=' || NEW.rowid"
+        )
+        undo_delete = (
+            f"'INSERT INTO {table} (rowid,{','.join(columns)}) VALUES (' || "
+            f"OLD.rowid || ',' || {old_values} || ')'"
+        )
+        # NOTE: Each trigger stores the statement that would reverse the change
+        #  it saw. They only write anything while a step is being recorded.
+        statements = (
+            f"DROP TRIGGER IF EXISTS {table}_journal_insert;",
+            f"DROP TRIGGER IF EXISTS {table}_journal_update;",
+            f"DROP TRIGGER IF EXISTS {table}_journal_delete;",
+            f"""
+            CREATE TRIGGER {table}_journal_insert AFTER INSERT ON {table} BEGIN
+              {_log_inverse(undo_insert)}
+            END;
+            """,
+            f"""
+            CREATE TRIGGER {table}_journal_update AFTER UPDATE ON {table} BEGIN
+              {_log_inverse(undo_update)}
+            END;
+            """,
+            f"""
+            CREATE TRIGGER {table}_journal_delete AFTER DELETE ON {table} BEGIN
+              {_log_inverse(undo_delete)}
+            END;
+            """,
+        )
+        for statement in statements:
+            connection.execute(statement)
+
+
+def _log_inverse(statement: str) -> str:
+    return (
+        f"INSERT INTO journal (step_id, sql_) SELECT id, {statement} "
+        f"FROM journal_steps WHERE status = 'recording';"
+    )
+
+
+class Journal:
+    def __init__(self, connection: Connection, limit: int = HISTORY_LIMIT) -> None:
+        self.connection = connection
+        self.limit = limit
+
+    @contextmanager
+    def record(self, label: str) -> Iterator[None]:
+        # NOTE: A new change makes everything that was undone unreachable.
+        self.connection.execute("DELETE FROM journal_steps WHERE status = 'undone';")
+        step_id = self.connection.execute(
+            "INSERT INTO journal_steps (label, status) VALUES (?, 'recording');",
+            (label,),
+        ).lastrowid
+        try:
+            yield
+        except Exception:
+            self.connection.rollback()
+            raise
+        self.connection.execute(
+            "UPDATE journal_steps SET status = 'done' WHERE id = ?;", (step_id,)
+        )
+        self.connection.execute(
+            "DELETE FROM journal_steps WHERE id NOT IN "
+            "(SELECT id FROM journal_steps ORDER BY id DESC LIMIT ?);",
+            (self.limit,),
+        )
+        self.connection.commit()
+
+    def undo_label(self) -> Optional[str]:
+        step = self._next_step("done")
+        return None if step is None else step[1]
+
+    def redo_label(self) -> Optional[str]:
+        step = self._next_step("undone")
+        return None if step is None else step[1]
+
+    def undo(self) -> Optional[str]:
+        return self._replay("done", "undone")
+
+    def redo(self) -> Optional[str]:
+        return self._replay("undone", "done")
+
+    def _next_step(self, status: str) -> Optional[tuple[int, str]]:
+        # NOTE: Undo walks back from the newest step while redo walks forward
+        #  from the oldest step that was undone.
+        order = "DESC" if status == "done" else "ASC"
+        return self.connection.execute(
+            f"SELECT id, label FROM journal_steps WHERE status = ? "
+            f"ORDER BY id {order} LIMIT 1;",
+            (status,),
+        ).fetchone()
+
+    def _replay(self, from_status: str, to_status: str) -> Optional[str]:
+        step = self._next_step(from_status)
+        if step is None:
+            return None
+
+        step_id, label = step
+        statements = self.connection.execute(
+            "SELECT sql_ FROM journal WHERE step_id = ? ORDER BY seq DESC;",
+            (step_id,),
+        ).fetchall()
+        # NOTE: Running the inverse statements records *their* inverses, which
+        #  is exactly what is needed to flip this step back later on.
+        self.connection.execute("DELETE FROM journal WHERE step_id = ?;", (step_id,))
+        self.connection.execute(
+            "UPDATE journal_steps SET status = 'recording' WHERE id = ?;", (step_id,)
+        )
+        try:
+            for (statement,) in statements:
+                self.connection.execute(statement)
+        except Exception:
+            self.connection.rollback()
+            raise
+        self.connection.execute(
+            "UPDATE journal_steps SET status = ? WHERE id = ?;", (to_status, step_id)
+        )
+        self.connection.commit()
+        return label
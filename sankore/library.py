@@ -0,0 +1,97 @@
+from sqlite3 import Connection, Cursor
+from typing import Optional
+
+from models import Book
+
+# NOTE: Dates in `ongoing_reads` are stored as DD/MM/YYYY, so this rearranges
+#  them into something that sorts properly. It has to match the expression in
+#  the `ongoing_reads_by_start` index exactly for SQLite to use that index.
+START_DATE = "(substr(start, 7, 4) || substr(start, 4, 2) || substr(start, 1, 2))"
+STATUS_RANK = (
+    "CASE WHEN ongoing_reads.book_title IS NOT NULL THEN 0 "
+    "WHEN EXISTS (SELECT 1 FROM finished_reads "
+    "WHERE finished_reads.book_title = books.title) THEN 2 ELSE 1 END"
+)
+STATUS_LABELS = ("Still Reading", "Not Started", "Finished")
+ONGOING_QUERY = (
+    "SELECT books.title, books.author, books.pages, books.rating, "
+    "ongoing_reads.page FROM ongoing_reads "
+    "JOIN books ON books.title = ongoing_reads.book_title "
+    f"ORDER BY {START_DATE} DESC;"
+)
+
+SORT_ORDERS: dict[str, str] = {
+    "Title": "books.title COLLATE NOCASE",
+    "Author": "books.author COLLATE NOCASE, books.title COLLATE NOCASE",
+    "Rating": "books.rating DESC, books.title COLLATE NOCASE",
+    "Last Read": "last_read DESC, books.title COLLATE NOCASE",
+    "Progress": (
+        "CAST(ongoing_reads.page AS REAL) / books.pages DESC, "
+        "books.title COLLATE NOCASE"
+    ),
+}
+GROUPINGS: dict[str, Optional[str]] = {
+    "Nothing": None,
+    "Author": "books.author COLLATE NOCASE",
+    "Status": STATUS_RANK,
+}
+
+
+def setup_indexes(connection: Connection) -> None:
+    connection.executescript(
+        f"""
+        CREATE INDEX IF NOT EXISTS books_by_author
+          ON books (author COLLATE NOCASE, title COLLATE NOCASE, pages, rating);
+        CREATE INDEX IF NOT EXISTS books_by_author_rating
+          ON books (author COLLATE NOCASE, rating DESC, title COLLATE NOCASE, pages);
+        CREATE INDEX IF NOT EXISTS books_by_rating
+          ON books (rating DESC, title COLLATE NOCASE, author, pages);
+
+        CREATE INDEX IF NOT EXISTS ongoing_reads_by_start
+          ON ongoing_reads ({START_DATE}, book_title, page);
+        CREATE INDEX IF NOT EXISTS progress_logs_book_title
+          ON progress_logs (book_title);
+        """
+    )
+    connection.commit()
+
+
+def books_query(sort_by: str, group_by: str) -> str:
+    group_key = GROUPINGS[group_by]
+    order = SORT_ORDERS[sort_by]
+    if group_key is not None and not order.startswith(group_key):
+        order = f"group_key, {order}"
+    return (
+        f"SELECT {group_key or 'null'} AS group_key, books.title, books.author, "
+        "books.pages, books.rating, ongoing_reads.page, "
+        "(SELECT count(*) FROM finished_reads "
+        "WHERE finished_reads.book_title = books.title) AS times_read, "
+        "(SELECT max(day) FROM progress_history "
+        "WHERE progress_history.book_title = books.title) AS last_read "
+        "FROM books LEFT JOIN ongoing_reads "
+        "ON ongoing_reads.book_title = books.title "
+        f"ORDER BY {order};"
+    )
+
+
+def load_books(
+    cursor: Cursor, sort_by: str, group_by: str
+) -> list[tuple[Optional[str], Book, Optional[int], int]]:
+    cursor.execute(books_query(sort_by, group_by))
+    return [
+        (
+            STATUS_LABELS[group] if group_by == "Status" else group,
+            Book(title, author, pages, rating),
+            page,
+            times_read,
+        )
+        for group, title, author, pages, rating, page, times_read, _ in cursor
+    ]
+
+
+def load_ongoing(cursor: Cursor) -> list[tuple[Book, int]]:
+    cursor.execute(ONGOING_QUERY)
+    return [
+        (Book(title, author, pages, rating), page)
+        for title, author, pages, rating, page in cursor.fetchall()
+    ]
@@ -0,0 +1,126 @@
+import zlib
+from hashlib import blake2b
+from sqlite3 import Connection, Cursor
+from typing import Optional, Union
+
+import journal
+import sync
+
+# NOTE: Shorter quotes are stored as plain text since compressing them saves
+#  little space and makes the database harder to read with other tools.
+COMPRESSION_THRESHOLD = 512
+
+
+def setup_quotes(connection: Connection) -> None:
+    # NOTE: A crash right after the swap commits would run this step again,
+    #  and the new table's compressed quotes can't be read as old ones.
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(quotes);")}
+    if "text_hash" in columns:
+        return
+
+    # NOTE: The whole swap happens in one transaction so that a crash half way
+    #  through leaves the old table as it was. `executescript` is avoided
+    #  since it commits as soon as it starts.
+    if not connection.in_transaction:
+        connection.execute("BEGIN;")
+    try:
+        _rebuild_quotes(connection)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def _rebuild_quotes(connection: Connection) -> None:
+    connection.execute(
+        """
+        CREATE TABLE quotes_new (
+          id INTEGER PRIMARY KEY,
+          text_hash TEXT NOT NULL UNIQUE,
+          text_ NOT NULL,
+          book_title TEXT,
+          author TEXT NOT NULL,
+          update_date TEXT NOT NULL,
+
+          FOREIGN KEY (book_title) REFERENCES books (title)
+            ON DELETE SET NULL
+            ON UPDATE CASCADE
+        );
+        """
+    )
+    # NOTE: Old quotes only remember the author, so they are only linked to a
+    #  book when that author has exactly one book in the library.
+    cursor = connection.cursor()
+    old_quotes = cursor.execute(
+        "SELECT text_, author, update_date FROM quotes ORDER BY rowid;"
+    ).fetchall()
+    for text, author, update_date in old_quotes:
+        titles = cursor.execute(
+            "SELECT title FROM books WHERE author = ? LIMIT 2;", (author,)
+        ).fetchall()
+        book_title = titles[0][0] if len(titles) == 1 else None
+        _insert_quote(cursor, "quotes_new", text, book_title, author, update_date)
+
+    connection.execute("DROP TABLE quotes;")
+    connection.execute("ALTER TABLE quotes_new RENAME TO quotes;")
+    connection.execute("CREATE INDEX quotes_book_title ON quotes (book_title);")
+    connection.execute("DELETE FROM row_changes WHERE table_name = 'quotes';")
+    sync.track_existing_rows(connection, "quotes")
+    sync.install_triggers(connection)
+    # NOTE: The undo history refers to quotes by their old row IDs and columns,
+    #  so it can't be replayed against the new table.
+    connection.execute("DELETE FROM journal_steps;")
+    journal.install_triggers(connection)
+
+
+def hash_text(text: str) -> str:
+    return blake2b(text.encode("utf8"), digest_size=16).hexdigest()
+
+
+def pack_text(text: str) -> Union[str, bytes]:
+    if len(text) < COMPRESSION_THRESHOLD:
+        return text
+    packed = zlib.compress(text.encode("utf8"), 9)
+    return packed if len(packed) < len(text.encode("utf8")) else text
+
+
+def unpack_text(stored: Union[str, bytes]) -> str:
+    return (
+        zlib.decompress(stored).decode("utf8") if isinstance(stored, bytes) else stored
+    )
+
+
+def save_quote(
+    cursor: Cursor,
+    text: str,
+    book_title: Optional[str],
+    author: str,
+    update_date: str,
+) -> bool:
+    return _insert_quote(cursor, "quotes", text, book_title, author, update_date)
+
+
+def _insert_quote(
+    cursor: Cursor,
+    table: str,
+    text: str,
+    book_title: Optional[str],
+    author: str,
+    update_date: str,
+) -> bool:
+    cursor.execute(
+        f"INSERT INTO {table} (text_hash, text_, book_title, author, update_date) "
+        "VALUES (?, ?, ?, ?, ?) ON CONFLICT (text_hash) DO NOTHING;",
+        (hash_text(text), pack_text(text), book_title, author, update_date),
+    )
+    return cursor.rowcount > 0
+
+
+def is_saved(cursor: Cursor, text: str) -> bool:
+    cursor.execute("SELECT 1 FROM quotes WHERE text_hash = ?;", (hash_text(text),))
+    return cursor.fetchone() is not None
+
+
+def load_quotes(cursor: Cursor) -> list[tuple[str, str]]:
+    cursor.execute("SELECT text_, author FROM quotes ORDER BY id;")
+    return [(unpack_text(text), author) for text, author in cursor.fetchall()]
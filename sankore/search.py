@@ -0,0 +1,170 @@
+from collections import Counter
+from sqlite3 import Connection, Cursor
+from typing import Optional
+
+MATCH_LIMIT = 5
+SIMILARITY_THRESHOLD = 0.5
+# NOTE: Common trigrams like "the" match a huge share of any library, so they
+#  are ignored. Of the rest, only the rarest few are used to find candidates
+#  and only the books sharing the most of them get scored in Python. This
+#  keeps each lookup fast no matter how big the library gets.
+CANDIDATE_LIMIT = 50
+FALLBACK_SCAN_LIMIT = 300
+MAX_TRIGRAM_BOOKS = 300
+QUERY_TRIGRAMS = 6
+
+
+def setup_title_index(connection: Connection) -> None:
+    connection.executescript(
+        """
+        CREATE INDEX IF NOT EXISTS books_by_title
+          ON books (title COLLATE NOCASE, author, pages, rating);
+
+        CREATE VIRTUAL TABLE IF NOT EXISTS book_titles USING fts5(
+          title,
+          content = 'books',
+          content_rowid = 'rowid',
+          tokenize = 'trigram'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS books_index_insert AFTER INSERT ON books BEGIN
+          INSERT INTO book_titles (rowid, title) VALUES (NEW.rowid, NEW.title);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS books_index_update AFTER UPDATE ON books BEGIN
+          INSERT INTO book_titles (book_titles, rowid, title)
+            VALUES ('delete', OLD.rowid, OLD.title);
+          INSERT INTO book_titles (rowid, title) VALUES (NEW.rowid, NEW.title);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS books_index_delete AFTER DELETE ON books BEGIN
+          INSERT INTO book_titles (book_titles, rowid, title)
+            VALUES ('delete', OLD.rowid, OLD.title);
+        END;
+
+        INSERT INTO book_titles (book_titles) VALUES ('rebuild');
+        """
+    )
+    connection.commit()
+
+
+def normalise(title: str) -> str:
+    return " ".join(title.casefold().split())
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[index : index + 3] for index in range(len(text) - 2)}
+
+
+def similarity(first: str, second: str) -> float:
+    first = normalise(first)
+    return _similarity(first, trigrams(first), normalise(second))
+
+
+def _similarity(first: str, first_grams: set[str], second: str) -> float:
+    second_grams = trigrams(second)
+    if not first_grams or not second_grams:
+        return float(first == second)
+    shared = len(first_grams & second_grams)
+    return 2 * shared / (len(first_grams) + len(second_grams))
+
+
+def similar_books(cursor: Cursor, title: str) -> list[tuple[str, str, float]]:
+    text = normalise(title)
+    text_grams = trigrams(text)
+    candidates = cursor.execute(
+        "SELECT title, author FROM books WHERE title = ? COLLATE NOCASE;",
+        (" ".join(title.split()),),
+    ).fetchall()
+
+    # NOTE: Trigrams spanning a space, like "e h", are mostly shared by any
+    #  two titles with common words so they are tried last.
+    hits: Counter[int] = Counter()
+    common = set()
+    rare_count = 0
+    for gram in sorted(text_grams, key=lambda gram: (" " in gram, gram)):
+        rowids = _find_trigram(cursor, gram)
+        if rowids is None:
+            common.add(gram)
+        else:
+            hits.update(rowids)
+            rare_count += 1
+        if rare_count == QUERY_TRIGRAMS:
+            break
+    best_rowids = [rowid for rowid, _ in hits.most_common(CANDIDATE_LIMIT)]
+    candidates += _load_titles(cursor, best_rowids)
+    matches = _score(text, text_grams, candidates)
+    if matches or not common:
+        return matches
+
+    # NOTE: Titles made of common words, like "the bex", have few rare
+    #  trigrams to go on. A close match almost always has every common
+    #  trigram from one half of the title or the other, and books with all of
+    #  them are far fewer. A capped number of those get checked as well,
+    #  closest in length first, which still turns up the likes of "the bec".
+    in_order = [text[index : index + 3] for index in range(len(text) - 2)]
+    common_in_order = list(dict.fromkeys(gram for gram in in_order if gram in common))
+    middle = (len(common_in_order) + 1) // 2
+    for half in (common_in_order[:middle], common_in_order[middle:]):
+        if half:
+            candidates += _load_titles(cursor, _find_all(cursor, half, len(text)))
+    return _score(text, text_grams, candidates)
+
+
+def _find_all(cursor: Cursor, grams: list[str], length: int) -> list[int]:
+    cursor.execute(
+        "SELECT rowid FROM (SELECT rowid, title FROM book_titles "
+        "WHERE book_titles MATCH ? LIMIT ?) "
+        "ORDER BY abs(length(title) - ?) LIMIT ?;",
+        (
+            " AND ".join(_quote(gram) for gram in grams),
+            FALLBACK_SCAN_LIMIT,
+            length,
+            CANDIDATE_LIMIT,
+        ),
+    )
+    return [rowid for (rowid,) in cursor.fetchall()]
+
+
+def _quote(gram: str) -> str:
+    return '"' + gram.replace('"', '""') + '"'
+
+
+def _find_trigram(cursor: Cursor, gram: str) -> Optional[list[int]]:
+    query = _quote(gram)
+    # NOTE: Checking for a book past the limit is much cheaper than fetching
+    #  them all, and most trigrams in a title turn out to be common ones.
+    cursor.execute(
+        "SELECT 1 FROM book_titles WHERE book_titles MATCH ? LIMIT 1 OFFSET ?;",
+        (query, MAX_TRIGRAM_BOOKS),
+    )
+    if cursor.fetchone() is not None:
+        return None
+    cursor.execute("SELECT rowid FROM book_titles WHERE book_titles MATCH ?;", (query,))
+    return [rowid for (rowid,) in cursor.fetchall()]
+
+
+def _load_titles(cursor: Cursor, rowids: list[int]) -> list[tuple[str, str]]:
+    return cursor.execute(
+        f"SELECT title, author FROM books "
+        f"WHERE rowid IN ({', '.join('?' for _ in rowids)});",
+        rowids,
+    ).fetchall()
+
+
+def _score(
+    text: str, text_grams: set[str], candidates: list[tuple[str, str]]
+) -> list[tuple[str, str, float]]:
+    matches = {
+        match_title: (
+            match_title,
+            author,
+            _similarity(text, text_grams, normalise(match_title)),
+        )
+        for match_title, author in candidates
+    }
+    return sorted(
+        (match for match in matches.values() if match[2] >= SIMILARITY_THRESHOLD),
+        key=lambda match: match[2],
+        reverse=True,
+    )[:MATCH_LIMIT]
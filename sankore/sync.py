@@ -0,0 +1,321 @@
+import gzip
+import json
+from base64 import b64decode, b64encode
+from pathlib import Path
+from sqlite3 import Connection
+from typing import Any, Iterable, Optional
+
+CHANGESET_FORMAT = 3
+# NOTE: Tables whose layout has changed since an older changeset format, so
+#  changes to them in those changesets can't be applied any more.
+OUTDATED_TABLES: dict[int, set[str]] = {1: {"quotes"}, 2: {"progress_history"}}
+CHANGESET_SUFFIX = ".changes"
+
+# NOTE: Every synced table maps to `(key_columns, other_columns)`. The key
+#  columns have to identify a row on *every* machine, so tables keyed by an
+#  autoincrementing ID can't be synced this way.
+TRACKED_TABLES: dict[str, tuple[tuple[str, ...], tuple[str, ...]]] = {
+    "books": (("title",), ("author", "pages", "rating")),
+    "quotes": (("text_hash",), ("text_", "book_title", "author", "update_date")),
+    "finished_reads": (("book_title", "start", "end_"), ()),
+    "ongoing_reads": (("book_title",), ("start", "page")),
+    "progress_history": (("book_title", "day", "site_id"), ("pages",)),
+}
+
+_DELETE_ORPHAN = "DELETE FROM {} WHERE rowid = ?;"
+ORPHAN_FIXES: dict[str, str] = {
+    "quotes": "UPDATE {} SET book_title = NULL WHERE rowid = ?;",
+}
+
+_NOW_STAMP = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+_NEXT_SEQ = "(SELECT coalesce(max(seq), 0) + 1 FROM row_changes)"
+_SITE_ID = "(SELECT value FROM sync_state WHERE key = 'site_id')"
+
+
+def setup_tracking(connection: Connection) -> None:
+    connection.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value);
+        INSERT OR IGNORE INTO sync_state VALUES
+          ('site_id', lower(hex(randomblob(8)))),
+          ('last_export', 0);
+
+        CREATE TABLE IF NOT EXISTS row_changes (
+          table_name TEXT NOT NULL,
+          row_key TEXT NOT NULL,
+          stamp INTEGER NOT NULL,
+          site_id TEXT NOT NULL,
+          seq INTEGER NOT NULL,
+
+          PRIMARY KEY (table_name, row_key)
+        );
+        CREATE INDEX IF NOT EXISTS row_changes_seq ON row_changes (seq);
+
+        CREATE TABLE IF NOT EXISTS imported_changesets (name TEXT PRIMARY KEY);
+        """
+    )
+    for table, _ in _existing_tables(connection):
+        track_existing_rows(connection, table)
+    install_triggers(connection)
+    connection.commit()
+
+
+def track_existing_rows(connection: Connection, table: str) -> None:
+    key_columns, _ = TRACKED_TABLES[table]
+    # NOTE: Existing rows get a stamp of 0 so that the first export from this
+    #  machine carries everything, but any real edit will beat it.
+    connection.execute(
+        f"INSERT OR IGNORE INTO row_changes "
+        f"SELECT '{table}', json_array({', '.join(key_columns)}), 0, "
+        f"{_SITE_ID}, {_NEXT_SEQ} FROM {table};"
+    )
+
+
+def install_triggers(connection: Connection) -> None:
+    for table, (key_columns, _) in _existing_tables(connection):
+        old_key = f"json_array({', '.join(f'OLD.{col}' for col in key_columns)})"
+        new_key = f"json_array({', '.join(f'NEW.{col}' for col in key_columns)})"
+        # NOTE: Not `executescript` since that would commit any transaction
+        #  that a migration has open.
+        statements = (
+            f"DROP TRIGGER IF EXISTS {table}_track_insert;",
+            f"DROP TRIGGER IF EXISTS {table}_track_update;",
+            f"DROP TRIGGER IF EXISTS {table}_track_delete;",
+            f"""
+            CREATE TRIGGER {table}_track_insert AFTER INSERT ON {table} BEGIN
+              {_record_change(table, new_key)}
+            END;
+            """,
+            f"""
+            CREATE TRIGGER {table}_track_update AFTER UPDATE ON {table} BEGIN
+              {_record_change(table, old_key)}
+              {_record_change(table, new_key)}
+            END;
+            """,
+            f"""
+            CREATE TRIGGER {table}_track_delete AFTER DELETE ON {table} BEGIN
+              {_record_change(table, old_key)}
+            END;
+            """,
+        )
+        for statement in statements:
+            connection.execute(statement)
+
+
+def _existing_tables(
+    connection: Connection,
+) -> list[tuple[str, tuple[tuple[str, ...], tuple[str, ...]]]]:
+    # NOTE: Tables only start being tracked once a migration has given them
+    #  the columns listed above, so earlier migration steps can still run on
+    #  a fresh database.
+    ready = []
+    for table, (key_columns, other_columns) in TRACKED_TABLES.items():
+        columns = {row[1] for row in connection.execute(f"PRAGMA table_info({table});")}
+        if columns.issuperset(key_columns + other_columns):
+            ready.append((table, (key_columns, other_columns)))
+    return ready
+
+
+def _record_change(table: str, key: str) -> str:
+    return (
+        f"INSERT INTO row_changes VALUES "
+        f"('{table}', {key}, {_NOW_STAMP}, {_SITE_ID}, {_NEXT_SEQ}) "
+        f"ON CONFLICT (table_name, row_key) DO UPDATE SET "
+        f"stamp = excluded.stamp, site_id = excluded.site_id, seq = excluded.seq;"
+    )
+
+
+def _get_state(connection: Connection, key: str) -> Any:
+    return connection.execute(
+        "SELECT value FROM sync_state WHERE key = ?;", (key,)
+    ).fetchone()[0]
+
+
+def _key_filter(key_columns: Iterable[str]) -> str:
+    # NOTE: `IS` rather than `=` since some key columns are nullable.
+    return " AND ".join(f"{col} IS ?" for col in key_columns)
+
+
+def _encode_value(value: Any) -> Any:
+    return (
+        {"blob": b64encode(value).decode("ascii")}
+        if isinstance(value, bytes)
+        else value
+    )
+
+
+def _decode_value(value: Any) -> Any:
+    return b64decode(value["blob"]) if isinstance(value, dict) else value
+
+
+def _fetch_row(connection: Connection, table: str, key: list) -> Optional[list]:
+    key_columns, other_columns = TRACKED_TABLES[table]
+    row = connection.execute(
+        f"SELECT {', '.join(key_columns + other_columns)} FROM {table} "
+        f"WHERE {_key_filter(key_columns)};",
+        key,
+    ).fetchone()
+    return None if row is None else [_encode_value(value) for value in row]
+
+
+def _apply_row(
+    connection: Connection, table: str, key: list, row: Optional[list]
+) -> None:
+    key_columns, other_columns = TRACKED_TABLES[table]
+    if row is None:
+        connection.execute(
+            f"DELETE FROM {table} WHERE {_key_filter(key_columns)};", key
+        )
+        return
+
+    columns = key_columns + other_columns
+    # NOTE: A real upsert, not `INSERT OR REPLACE`, since replacing a row
+    #  deletes it first and that would cascade to its dependent rows.
+    on_conflict = (
+        "DO UPDATE SET " + ", ".join(f"{col} = excluded.{col}" for col in other_columns)
+        if other_columns
+        else "DO NOTHING"
+    )
+    connection.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)}) "
+        f"ON CONFLICT ({', '.join(key_columns)}) {on_conflict};",
+        [_decode_value(value) for value in row],
+    )
+
+
+def export_changes(connection: Connection, folder: Path) -> Optional[Path]:
+    site_id = _get_state(connection, "site_id")
+    last_export = _get_state(connection, "last_export")
+    # NOTE: Changes merged in from other machines are already in the folder
+    #  as their own changesets, so only this machine's changes go out.
+    records = connection.execute(
+        "SELECT table_name, row_key, stamp, site_id, seq FROM row_changes "
+        "WHERE seq > ? AND site_id = ? ORDER BY seq;",
+        (last_export, site_id),
+    ).fetchall()
+    if not records:
+        return None
+
+    changes = [
+        {
+            "table": table,
+            "key": row_key,
+            "stamp": stamp,
+            "site": origin,
+            "row": _fetch_row(connection, table, json.loads(row_key)),
+        }
+        for table, row_key, stamp, origin, _ in records
+    ]
+    last_seq = records[-1][4]
+    path = folder / f"{site_id}-{last_seq:08}{CHANGESET_SUFFIX}"
+    with gzip.open(path, "wt", encoding="utf8") as file:
+        json.dump(
+            {"format": CHANGESET_FORMAT, "site": site_id, "changes": changes},
+            file,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+    connection.execute(
+        "UPDATE sync_state SET value = ? WHERE key = 'last_export';", (last_seq,)
+    )
+    connection.commit()
+    return path
+
+
+def _read_changeset(path: Path) -> dict[str, Any]:
+    with gzip.open(path, "rt", encoding="utf8") as file:
+        changeset = json.load(file)
+    if changeset.get("format") not in range(1, CHANGESET_FORMAT + 1):
+        raise ValueError(f"{path.name} is not a changeset that Sankore can read.")
+    return changeset
+
+
+def _apply_changeset(connection: Connection, changeset: dict[str, Any]) -> int:
+    format_ = changeset["format"]
+    outdated = set().union(
+        *(tables for number, tables in OUTDATED_TABLES.items() if format_ <= number)
+    )
+    applied = 0
+    for change in changeset["changes"]:
+        table, row_key = change["table"], change["key"]
+        if table not in TRACKED_TABLES or table in outdated:
+            continue
+        local = connection.execute(
+            "SELECT stamp, site_id FROM row_changes "
+            "WHERE table_name = ? AND row_key = ?;",
+            (table, row_key),
+        ).fetchone()
+        # NOTE: Last writer wins. Ties on the timestamp go to the higher
+        #  site ID so that every machine settles on the same version.
+        incoming = (change["stamp"], change["site"])
+        if local is not None and tuple(local) >= incoming:
+            continue
+
+        _apply_row(connection, table, json.loads(row_key), change["row"])
+        connection.execute(
+            f"INSERT INTO row_changes VALUES (?, ?, ?, ?, {_NEXT_SEQ}) "
+            "ON CONFLICT (table_name, row_key) DO UPDATE SET "
+            "stamp = excluded.stamp, site_id = excluded.site_id, "
+            "seq = excluded.seq;",
+            (table, row_key, *incoming),
+        )
+        applied += 1
+    return applied
+
+
+def _resolve_orphans(connection: Connection) -> None:
+    # NOTE: A book can be deleted on one machine while another machine adds a
+    #  read for it. Whichever order the changes arrive in, the book stays
+    #  deleted and its dependent rows go the way its foreign keys say they
+    #  should, so every machine ends up with the same data.
+    orphans = connection.execute("PRAGMA foreign_key_check;").fetchall()
+    for table, rowid, *_ in orphans:
+        fix = ORPHAN_FIXES.get(table, _DELETE_ORPHAN)
+        connection.execute(fix.format(table), (rowid,))
+
+
+def _merge(connection: Connection, changesets: list[tuple[str, dict[str, Any]]]) -> int:
+    # NOTE: `defer_foreign_keys` is switched off again at the end of every
+    #  transaction, so the transaction has to be open before it is set.
+    if not connection.in_transaction:
+        connection.execute("BEGIN;")
+    connection.execute("PRAGMA defer_foreign_keys = ON;")
+    try:
+        applied = sum(
+            _apply_changeset(connection, changeset) for _, changeset in changesets
+        )
+        _resolve_orphans(connection)
+        # NOTE: The undo history finds rows by their row IDs, which no longer
+        #  point at the same rows once another machine's changes are in.
+        if applied:
+            connection.execute("DELETE FROM journal_steps;")
+        connection.executemany(
+            "INSERT OR IGNORE INTO imported_changesets VALUES (?);",
+            [(name,) for name, _ in changesets],
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return applied
+
+
+def import_changes(connection: Connection, path: Path) -> int:
+    return _merge(connection, [(path.name, _read_changeset(path))])
+
+
+def sync_folder(connection: Connection, folder: Path) -> tuple[int, Optional[Path]]:
+    site_id = _get_state(connection, "site_id")
+    imported = {
+        name for (name,) in connection.execute("SELECT name FROM imported_changesets;")
+    }
+    # NOTE: Everything new in the folder is merged in one go so that rows can
+    #  depend on rows from another machine's changeset.
+    changesets = [
+        (path.name, _read_changeset(path))
+        for path in sorted(folder.glob(f"*{CHANGESET_SUFFIX}"))
+        if not path.name.startswith(f"{site_id}-") and path.name not in imported
+    ]
+    applied = _merge(connection, changesets) if changesets else 0
+    return applied, export_changes(connection, folder)
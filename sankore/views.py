@@ -1,20 +1,40 @@
-from datetime import datetime
-from sqlite3 import Connection, Cursor
-from typing import Callable
-
-from PySide6.QtCore import QCoreApplication, Qt
-from PySide6.QtGui import QIcon, QPixmap
+from datetime import date, timedelta
+from pathlib import Path
+from sqlite3 import Connection, Cursor, DatabaseError
+from typing import Callable, Optional
+
+from PySide6.QtCore import QCoreApplication, QEvent, QPoint, QRect, QSize, Qt
+from PySide6.QtGui import (
+    QColor,
+    QIcon,
+    QKeySequence,
+    QPainter,
+    QPaintEvent,
+    QPixmap,
+    QResizeEvent,
+)
 from PySide6 import QtWidgets as widgets
 
+import activity
 import dialogs
+import library
+import quotes
+import search
+import sync
+from journal import Journal
 from models import Book
 
 WidgetBuilder = Callable[[widgets.QWidget, Cursor], widgets.QWidget]
 
+CARD_WIDTH = 260
 CARD_SIZE_POLICY = widgets.QSizePolicy(
     widgets.QSizePolicy.Minimum, widgets.QSizePolicy.Fixed
 )
 
+HEATMAP_COLOURS = tuple(
+    QColor(code) for code in ("#ebedf0", "#9be9a8", "#40c463", "#30a14e", "#216e39")
+)
+
 get_icon = lambda icon_name: QIcon(QPixmap(dialogs.ASSETS[icon_name]))
 
 
@@ -23,18 +43,46 @@ class Home(widgets.QMainWindow):
         super().__init__()
         self.connection = connection
         self.cursor = connection.cursor()
+        self.journal = Journal(connection)
 
         QCoreApplication.setApplicationName(title)
         self.setWindowIcon(QIcon(QPixmap(dialogs.ASSETS["app_icon"])))
         self.setWindowTitle(title)
 
         new_menu = self.menuBar().addMenu("New")
+        edit_menu = self.menuBar().addMenu("Edit")
+        view_menu = self.menuBar().addMenu("View")
+        sync_menu = self.menuBar().addMenu("Sync")
         about_menu = self.menuBar().addMenu("About")
         new_book_action = new_menu.addAction("New Book")
+        self.undo_action = edit_menu.addAction("Undo")
+        self.redo_action = edit_menu.addAction("Redo")
+        activity_action = view_menu.addAction("Reading Activity")
+        sync_action = sync_menu.addAction("Sync with Folder...")
         about_action = about_menu.addAction("About")
         new_book_action.triggered.connect(self.new_book)
+        self.undo_action.setShortcut(QKeySequence.Undo)
+        self.redo_action.setShortcut(QKeySequence.Redo)
+        self.undo_action.triggered.connect(self.undo)
+        self.redo_action.triggered.connect(self.redo)
+        activity_action.triggered.connect(self._show_activity)
+        sync_action.triggered.connect(self.sync_with_folder)
+        self._update_history_actions()
         about_action.triggered.connect(self._show_about)
 
+        self.sort_picker = widgets.QComboBox(self)
+        self.sort_picker.addItems(list(library.SORT_ORDERS))
+        self.sort_picker.currentTextChanged.connect(self._change_order)
+        self.group_picker = widgets.QComboBox(self)
+        self.group_picker.addItems(list(library.GROUPINGS))
+        self.group_picker.currentTextChanged.connect(self._change_order)
+        order_layout = widgets.QHBoxLayout()
+        order_layout.addWidget(widgets.QLabel("Sort by:"))
+        order_layout.addWidget(self.sort_picker)
+        order_layout.addWidget(widgets.QLabel("Group by:"))
+        order_layout.addWidget(self.group_picker)
+        order_layout.addStretch()
+
         scroll_area = widgets.QScrollArea(self)
         scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.cards = CardView(self)
@@ -52,11 +100,20 @@ class Home(widgets.QMainWindow):
         sidebar_layout.addWidget(widgets.QLabel(dialogs.header("Recent Quotes", 3)))
         sidebar_layout.addWidget(self.sidebar.quotes)
 
+        self.activity = ActivityHeatmap(self, self.cursor)
+        self.activity_window = widgets.QDialog(self)
+        self.activity_window.setWindowTitle("Reading Activity")
+        activity_scroll = widgets.QScrollArea(self.activity_window)
+        activity_scroll.setWidget(self.activity)
+        activity_layout = widgets.QVBoxLayout(self.activity_window)
+        activity_layout.addWidget(activity_scroll)
+
         centre = widgets.QWidget(self)
         self.setCentralWidget(centre)
         centre_layout = widgets.QGridLayout(centre)
-        centre_layout.addWidget(scroll_area, 0, 0, 1, 20)
-        centre_layout.addWidget(self.sidebar, 0, 21, 1, 5)
+        centre_layout.addLayout(order_layout, 0, 0, 1, 20)
+        centre_layout.addWidget(scroll_area, 1, 0, 1, 20)
+        centre_layout.addWidget(self.sidebar, 0, 21, 2, 5)
 
     def _show_about(self) -> int:
         about_text = (
@@ -72,18 +129,73 @@ class Home(widgets.QMainWindow):
         layout.addWidget(label)
         return dialog.exec()
 
+    def _change_order(self) -> None:
+        self.cards.sort_by = self.sort_picker.currentText()
+        self.cards.group_by = self.group_picker.currentText()
+        self.cards.update_view()
+
+    def _show_activity(self) -> None:
+        self.activity_window.show()
+        self.activity_window.raise_()
+
+    def _update_history_actions(self) -> None:
+        undo_label = self.journal.undo_label()
+        redo_label = self.journal.redo_label()
+        self.undo_action.setText(f"Undo {undo_label}" if undo_label else "Undo")
+        self.redo_action.setText(f"Redo {redo_label}" if redo_label else "Redo")
+        self.undo_action.setEnabled(undo_label is not None)
+        self.redo_action.setEnabled(redo_label is not None)
+
     # noinspection PyUnresolvedReferences
     def _update_view(self) -> None:
         self.cards.update_view()
         self.sidebar.read.update_view()
         self.sidebar.quotes.update_view()
+        self._update_history_actions()
+
+    def undo(self) -> None:
+        self._replay_history(self.journal.undo)
+
+    def redo(self) -> None:
+        self._replay_history(self.journal.redo)
+
+    def _replay_history(self, replay: Callable[[], Optional[str]]) -> None:
+        try:
+            replay()
+        except DatabaseError as error:
+            widgets.QMessageBox.warning(self, "Couldn't change history", str(error))
+        self.activity.reload()
+        self._update_view()
+
+    def sync_with_folder(self) -> None:
+        folder = widgets.QFileDialog.getExistingDirectory(self, "Sync with Folder")
+        if not folder:
+            return
+        try:
+            applied, exported = sync.sync_folder(self.connection, Path(folder))
+        except (DatabaseError, OSError, ValueError) as error:
+            widgets.QMessageBox.warning(self, "Sync failed", str(error))
+            return
+        self.activity.reload()
+        self._update_view()
+        widgets.QMessageBox.information(
+            self,
+            "Sync complete",
+            f"Applied {applied} change(s) from other machines. "
+            + (
+                f"Saved this machine's changes to <em>{exported.name}</em>."
+                if exported is not None
+                else "There were no new changes to save."
+            ),
+        )
 
     def delete_book(self, book: Book) -> None:
         dialog = dialogs.AreYouSure(self, book.title)
         dialog.exec()
         if dialog.save_changes:
-            self.cursor.execute("DELETE FROM books WHERE title = ?;", (book.title,))
-            self.connection.commit()
+            with self.journal.record(f'Delete "{book.title}"'):
+                self.cursor.execute("DELETE FROM books WHERE title = ?;", (book.title,))
+            self.activity.reload()
             self._update_view()
 
     def edit_book(self, book: Book) -> None:
@@ -91,58 +203,75 @@ class Home(widgets.QMainWindow):
         dialog.exec()
         if dialog.save_changes:
             new_title, new_author, new_pages = dialog.result()
-            self.cursor.execute(
-                "UPDATE books SET title = ?, author = ?, pages = ? WHERE title = ?;",
-                (new_title, new_author, new_pages, book.title),
-            )
-            self.connection.commit()
+            with self.journal.record(f'Edit "{book.title}"'):
+                self.cursor.execute(
+                    "UPDATE books SET title = ?, author = ?, pages = ? "
+                    "WHERE title = ?;",
+                    (new_title, new_author, new_pages, book.title),
+                )
             self._update_view()
 
     def log_completed(self, book: Book) -> None:
         dialog = dialogs.LogRead(self, book)
         dialog.exec()
         if dialog.save_changes:
-            self.cursor.execute(
-                "INSERT INTO finished_reads VALUES (?, ?, ?);", dialog.result()
-            )
-            self.connection.commit()
+            _, _, end = dialog.result()
+            end_day = activity.parse_date(end)
+            with self.journal.record(f'Log read of "{book.title}"'):
+                self.cursor.execute(
+                    "INSERT INTO finished_reads VALUES (?, ?, ?);", dialog.result()
+                )
+                activity.record_activity(self.cursor, book.title, end_day, 0)
+            self.activity.add_pages(end_day, 0)
             self._update_view()
 
     def quote_book(self, book: Book) -> None:
         dialog = dialogs.QuoteBook(self, book)
         dialog.exec()
         if dialog.save_changes:
-            self.cursor.execute("INSERT INTO quotes VALUES (?, ?, ?);", dialog.result())
-            self.connection.commit()
+            text, *_ = dialog.result()
+            if quotes.is_saved(self.cursor, text):
+                widgets.QMessageBox.information(
+                    self, "Already saved", "You've already saved this quote."
+                )
+                return
+            with self.journal.record(f'Quote "{book.title}"'):
+                quotes.save_quote(self.cursor, *dialog.result())
             # noinspection PyUnresolvedReferences
             self.sidebar.quotes.update_view()
+            self._update_history_actions()
 
     def new_book(self) -> None:
-        dialog = dialogs.NewBook(self)
+        dialog = dialogs.NewBook(
+            self, lambda title: search.similar_books(self.cursor, title)
+        )
         dialog.exec()
         if dialog.save_changes:
-            self.cursor.execute(
-                "INSERT INTO books VALUES (?, ?, ?, null);", dialog.result()
-            )
-            self.connection.commit()
+            title, *_ = dialog.result()
+            with self.journal.record(f'Add "{title}"'):
+                self.cursor.execute(
+                    "INSERT INTO books VALUES (?, ?, ?, null);", dialog.result()
+                )
             self._update_view()
 
     def rate_book(self, book: Book) -> None:
         dialog = dialogs.RateBook(self, book)
         dialog.exec()
         if dialog.save_changes:
-            self.cursor.execute(
-                "UPDATE books SET rating = ? WHERE title = ?;", dialog.result()
-            )
-            self.connection.commit()
+            with self.journal.record(f'Rate "{book.title}"'):
+                self.cursor.execute(
+                    "UPDATE books SET rating = ? WHERE title = ?;", dialog.result()
+                )
             self._update_view()
 
     def start_reading(self, book: Book) -> None:
-        self.cursor.execute(
-            "INSERT INTO ongoing_reads VALUES (?, ?, ?);",
-            (book.title, dialogs.get_today(), 1),
-        )
-        self.connection.commit()
+        with self.journal.record(f'Start reading "{book.title}"'):
+            self.cursor.execute(
+                "INSERT INTO ongoing_reads VALUES (?, ?, ?);",
+                (book.title, dialogs.get_today(), 1),
+            )
+            activity.record_activity(self.cursor, book.title, date.today(), 0)
+        self.activity.add_pages(date.today(), 0)
         self._update_view()
 
     def save_progress(self, book: Book) -> None:
@@ -150,21 +279,138 @@ class Home(widgets.QMainWindow):
         dialog = dialogs.UpdateProgress(self, book, old_progress["page"])
         dialog.exec()
         if dialog.save_changes:
-            if dialog.is_finished():
-                self.cursor.execute(
-                    "DELETE FROM ongoing_reads WHERE book_title = ?;",
-                    (book.title,),
-                ).execute(
-                    "INSERT INTO finished_reads VALUES (?, ?, ?);",
-                    (book.title, old_progress["start"], dialogs.get_today()),
+            new_page = book.pages if dialog.is_finished() else dialog.new_value()
+            pages_read = max(new_page - old_progress["page"], 0)
+            with self.journal.record(f'Update progress on "{book.title}"'):
+                activity.record_activity(
+                    self.cursor, book.title, date.today(), pages_read
                 )
+                if dialog.is_finished():
+                    self.cursor.execute(
+                        "DELETE FROM ongoing_reads WHERE book_title = ?;",
+                        (book.title,),
+                    ).execute(
+                        "INSERT INTO finished_reads VALUES (?, ?, ?);",
+                        (book.title, old_progress["start"], dialogs.get_today()),
+                    )
+                else:
+                    self.cursor.execute(
+                        "UPDATE ongoing_reads SET page = ? WHERE book_title = ?;",
+                        (dialog.new_value(), book.title),
+                    )
+            self.activity.add_pages(date.today(), pages_read)
+            self._update_view()
+
+
+class ActivityHeatmap(widgets.QWidget):
+    CELL_SIZE = 11
+    CELL_GAP = 2
+    LABEL_WIDTH = 40
+    YEAR_GAP = 12
+
+    def __init__(self, parent: widgets.QWidget, cursor: Cursor) -> None:
+        super().__init__(parent)
+        self.cursor = cursor
+        self.years: dict[int, dict[date, int]] = {}
+        self.reload()
+
+    def reload(self) -> None:
+        self.years = activity.daily_activity(self.cursor)
+        self._resize()
+
+    def add_pages(self, day: date, pages: int) -> None:
+        # NOTE: Saving progress only touches one day, so there's no need to go
+        #  back to the database for the whole history.
+        new_year = day.year not in self.years
+        year = self.years.setdefault(day.year, {})
+        year[day] = year.get(day, 0) + max(pages, 0)
+        if new_year:
+            self._resize()
+        else:
+            self.update(self._year_rect(day.year))
+
+    def _shown_years(self) -> list[int]:
+        latest = max(date.today().year, *self.years)
+        earliest = min(latest, *self.years)
+        return list(range(latest, earliest - 1, -1))
+
+    def _year_height(self) -> int:
+        return 7 * (self.CELL_SIZE + self.CELL_GAP) + self.YEAR_GAP
+
+    def _year_rect(self, year: int) -> QRect:
+        row = self._shown_years().index(year)
+        return QRect(0, row * self._year_height(), self.width(), self._year_height())
+
+    def _resize(self) -> None:
+        width = self.LABEL_WIDTH + 54 * (self.CELL_SIZE + self.CELL_GAP)
+        self.setFixedSize(QSize(width, len(self._shown_years()) * self._year_height()))
+        self.update()
+
+    def _cell_position(self, day: date, top: int) -> QPoint:
+        jan_first = date(day.year, 1, 1)
+        week = (day - jan_first + timedelta(days=jan_first.weekday())).days // 7
+        step = self.CELL_SIZE + self.CELL_GAP
+        return QPoint(self.LABEL_WIDTH + week * step, top + day.weekday() * step)
+
+    def _day_at(self, point: QPoint) -> Optional[date]:
+        step = self.CELL_SIZE + self.CELL_GAP
+        row, y_offset = divmod(point.y(), self._year_height())
+        week, x_offset = divmod(point.x() - self.LABEL_WIDTH, step)
+        years = self._shown_years()
+        if x_offset >= self.CELL_SIZE or point.x() < self.LABEL_WIDTH:
+            return None
+        if row >= len(years) or y_offset >= 7 * step:
+            return None
+        jan_first = date(years[row], 1, 1)
+        day = jan_first + timedelta(
+            days=week * 7 + y_offset // step - jan_first.weekday()
+        )
+        return day if day.year == jan_first.year else None
+
+    def event(self, event: QEvent) -> bool:
+        if event.type() == QEvent.ToolTip:
+            day = self._day_at(event.pos())
+            if day is None:
+                widgets.QToolTip.hideText()
             else:
-                self.cursor.execute(
-                    "UPDATE ongoing_reads SET page = ? WHERE book_title = ?;",
-                    (dialog.new_value(), book.title),
+                pages = self.years.get(day.year, {}).get(day)
+                description = "No reading" if pages is None else f"{pages} pages"
+                widgets.QToolTip.showText(
+                    event.globalPos(), f"{description} on {day:%d %b %Y}", self
                 )
-            self.connection.commit()
-            self._update_view()
+            return True
+        return super().event(event)
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        painter = QPainter(self)
+        for year in self._shown_years():
+            year_rect = self._year_rect(year)
+            if not year_rect.intersects(event.rect()):
+                continue
+
+            painter.setPen(self.palette().text().color())
+            painter.drawText(
+                QRect(0, year_rect.top(), self.LABEL_WIDTH, self.CELL_SIZE * 2),
+                Qt.AlignLeft | Qt.AlignTop,
+                str(year),
+            )
+            days = self.years.get(year, {})
+            most_pages = max(days.values(), default=0) or 1
+            day = date(year, 1, 1)
+            while day.year == year:
+                if day in days:
+                    level = 1 + min(3, (3 * days[day]) // most_pages)
+                else:
+                    level = 0
+                painter.fillRect(
+                    QRect(
+                        self._cell_position(day, year_rect.top()),
+                        QSize(self.CELL_SIZE, self.CELL_SIZE),
+                    ),
+                    HEATMAP_COLOURS[level],
+                )
+                day += timedelta(days=1)
+        painter.end()
 
 
 class CardView(widgets.QWidget):
@@ -175,22 +421,49 @@ class CardView(widgets.QWidget):
         self.cursor = self.home.connection.cursor()
         self.layout_ = widgets.QGridLayout(self)
         self.layout_.setAlignment(Qt.AlignTop)
+        self.sort_by = next(iter(library.SORT_ORDERS))
+        self.group_by = next(iter(library.GROUPINGS))
+        self.columns = 3
+        self.items: list[tuple[bool, widgets.QWidget]] = []
 
     def _populate(self) -> None:
-        records = sorted(
-            self.cursor.execute("SELECT * FROM books;").fetchall(),
-            key=lambda b: b[0],
-        )
+        records = library.load_books(self.cursor, self.sort_by, self.group_by)
+        last_group = None
+        for group, book, current_page, times_read in records:
+            if group is not None and str(group).casefold() != last_group:
+                last_group = str(group).casefold()
+                label = widgets.QLabel(dialogs.header(str(group).title(), 3), self)
+                self.items.append((True, label))
+            self.items.append((False, Card(self, book, current_page, times_read)))
+
+    def _arrange(self) -> None:
+        # NOTE: Only the layout is cleared here, the widgets themselves are kept
+        #  so that resizing the window doesn't mean rebuilding every card.
+        while self.layout_.takeAt(0) is not None:
+            pass
         row, col = 0, 0
-        for record in records:
-            self.layout_.addWidget(
-                Card(self, Book(*record)), row, col, Qt.AlignBaseline
-            )
-            row, col = ((row + 1), 0) if col > 1 else (row, (col + 1))
+        for is_header, widget in self.items:
+            if is_header:
+                row = row + 1 if col else row
+                self.layout_.addWidget(widget, row, 0, 1, self.columns)
+                row, col = row + 1, 0
+            else:
+                self.layout_.addWidget(widget, row, col, Qt.AlignBaseline)
+                last_col = col == self.columns - 1
+                row, col = ((row + 1), 0) if last_col else (row, (col + 1))
+
+    def resizeEvent(self, event: QResizeEvent) -> None:
+        columns = max(1, event.size().width() // CARD_WIDTH)
+        if columns != self.columns:
+            self.columns = columns
+            self._arrange()
+        super().resizeEvent(event)
 
     def update_view(self) -> None:
         _clear_layout(self.layout_)
+        self.items = []
         self._populate()
+        self._arrange()
 
     def delete_book(self, book: Book) -> None:
         return self.home.delete_book(book)
@@ -215,10 +488,17 @@ class CardView(widgets.QWidget):
 
 
 class Card(widgets.QFrame):
-    def __init__(self, parent: CardView, book: Book) -> None:
+    def __init__(
+        self,
+        parent: CardView,
+        book: Book,
+        current_page: Optional[int],
+        times_read: int,
+    ) -> None:
         super().__init__(parent)
         self.book = book
         self.holder = parent
+        self.current_page = current_page
         self.setSizePolicy(CARD_SIZE_POLICY)
         self.setFrameStyle(widgets.QFrame.StyledPanel)
         layout = widgets.QVBoxLayout(self)
@@ -236,15 +516,15 @@ class Card(widgets.QFrame):
         author = widgets.QLabel(book.author.title())
         layout.addWidget(author, alignment=Qt.AlignLeft)
 
-        if run := book.current_run(self.holder.cursor):
+        if current_page is not None:
             bar = widgets.QProgressBar(self)
             bar.setMaximum(book.pages)
-            bar.setValue(dialogs.moderate(run["page"], book.pages))
+            bar.setValue(dialogs.moderate(current_page, book.pages))
             layout.addWidget(bar)
-        elif (times_read := len(self.book.reads(self.holder.cursor))) > 1:
+        elif times_read > 1:
             read_status = widgets.QLabel(f"<i>Read {times_read} times</i>")
             layout.addWidget(read_status, alignment=Qt.AlignLeft)
-        elif not self.book.reads(self.holder.cursor):
+        elif not times_read:
             read_status = widgets.QLabel("<i>Never read</i>")
             layout.addWidget(read_status, alignment=Qt.AlignLeft)
 
@@ -264,7 +544,7 @@ class Card(widgets.QFrame):
         menu = widgets.QMenu(self)
         quote_action = menu.addAction(get_icon("quote_icon"), "Save quote")
         quote_action.triggered.connect(self.quote_book)
-        if self.book.current_run(self.holder.cursor) is not None:
+        if self.current_page is not None:
             update_action = menu.addAction(get_icon("bookmark_icon"), "Update position")
             update_action.triggered.connect(self.save_progress)
         else:
@@ -321,8 +601,7 @@ class QuoteBar(widgets.QScrollArea):
 
     def update_view(self) -> None:
         _clear_layout(self.layout_)
-        quotes = self.cursor.execute("SELECT text_, author FROM quotes;").fetchall()
-        for text, author in quotes:
+        for text, author in quotes.load_quotes(self.cursor):
             card = widgets.QLabel(f'"{text}" - <b>{author.title()}</b>')
             card.setFrameStyle(widgets.QFrame.StyledPanel)
             card.setSizePolicy(CARD_SIZE_POLICY)
@@ -352,20 +631,9 @@ class ReadingBar(widgets.QScrollArea):
 
     def update_view(self) -> None:
         _clear_layout(self.layout_)
-        records = sorted(
-            self.cursor.execute("SELECT * FROM ongoing_reads;").fetchall(),
-            key=lambda pair: datetime.strptime(pair[1], "%d/%m/%Y"),
-            reverse=True,
-        )
-        for title, *_ in records:
-            self.cursor.execute("SELECT * FROM books WHERE title = ?;", (title,))
+        for book, current_page in library.load_ongoing(self.cursor):
             self.layout_.addWidget(
-                SmallCard(
-                    self,
-                    Book(*self.cursor.fetchone()),
-                    self.cursor,
-                    self.save_progress,
-                )
+                SmallCard(self, book, current_page, self.save_progress)
             )
 
 
@@ -374,7 +642,7 @@ class SmallCard(widgets.QFrame):
         self,
         parent: widgets.QWidget,
         book: Book,
-        cursor: Cursor,
+        current_page: int,
         save_progress: Callable[[Book], None],
     ) -> None:
         super().__init__(parent)
@@ -384,7 +652,6 @@ class SmallCard(widgets.QFrame):
 
         layout = widgets.QVBoxLayout(self)
         layout.addWidget(widgets.QLabel(book.title))
-        current_page = book.current_run(cursor)["page"]
         # noinspection PyArgumentList
         layout.addWidget(
             widgets.QProgressBar(
@@ -0,0 +1,23 @@
+from sqlite3 import connect, Connection
+from typing import Callable
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+def make_db() -> Callable[[], Connection]:
+    connections = []
+
+    def make() -> Connection:
+        connection = connect(":memory:")
+        connection.execute("PRAGMA foreign_keys = ON;")
+        database.create_tables(connection)
+        database.migrate(connection)
+        connections.append(connection)
+        return connection
+
+    yield make
+    for connection in connections:
+        connection.close()
@@ -0,0 +1,28 @@
+import database
+import quotes
+from test_quotes import generate_quotes, make_old_db
+
+
+def test_every_step_can_run_twice(tmp_path):
+    texts = generate_quotes(100)
+    connection = make_old_db(tmp_path / "library.sqlite3", texts)
+    connection.execute("INSERT INTO ongoing_reads VALUES ('book 1', '01/02/2024', 5);")
+    connection.commit()
+    database.migrate(connection)
+    before = connection.execute("SELECT * FROM quotes ORDER BY id;").fetchall()
+
+    # NOTE: As if the app crashed after each step but before saving its number.
+    for step in database.MIGRATIONS:
+        step(connection)
+    assert connection.execute("SELECT * FROM quotes ORDER BY id;").fetchall() == before
+    assert [text for text, _ in quotes.load_quotes(connection.cursor())] == texts
+    assert connection.execute(
+        "SELECT book_title, day, pages FROM progress_history;"
+    ).fetchall() == [("book 1", "2024-02-01", 0)]
+    assert connection.execute("PRAGMA integrity_check;").fetchone() == ("ok",)
+
+
+def test_fresh_databases_reach_the_latest_version(make_db):
+    connection = make_db()
+    version = connection.execute("PRAGMA user_version;").fetchone()[0]
+    assert version == len(database.MIGRATIONS)
@@ -0,0 +1,161 @@
+from datetime import date
+
+import pytest
+
+import activity
+import journal
+import quotes
+import sync
+
+
+def snapshot(connection):
+    return {
+        table: connection.execute(
+            f"SELECT rowid, * FROM {table} ORDER BY rowid;"
+        ).fetchall()
+        for table in journal.JOURNALED_TABLES
+    }
+
+
+@pytest.fixture
+def library(make_db):
+    connection = make_db()
+    cursor = connection.cursor()
+    cursor.execute("INSERT INTO books VALUES ('dune', 'herbert', 500, 4);")
+    cursor.execute("INSERT INTO books VALUES ('emma', 'austen', 300, null);")
+    cursor.execute(
+        "INSERT INTO finished_reads VALUES ('dune', '01/01/2020', '02/01/2020');"
+    )
+    cursor.execute("INSERT INTO ongoing_reads VALUES ('dune', '03/04/2024', 120);")
+    activity.record_activity(cursor, "dune", date(2024, 4, 3), 120)
+    quotes.save_quote(cursor, "Fear is the mind-killer.", "dune", "herbert", "today")
+    connection.commit()
+    return connection
+
+
+def test_undo_and_redo_a_delete(library):
+    history = journal.Journal(library)
+    before = snapshot(library)
+    with history.record('Delete "dune"'):
+        library.execute("DELETE FROM books WHERE title = 'dune';")
+    after = snapshot(library)
+    assert after["finished_reads"] == after["ongoing_reads"] == []
+    assert after["progress_history"] == []
+
+    assert history.undo() == 'Delete "dune"'
+    assert snapshot(library) == before
+    assert history.redo() == 'Delete "dune"'
+    assert snapshot(library) == after
+    assert history.undo() == 'Delete "dune"'
+    assert snapshot(library) == before
+
+
+def test_undo_and_redo_a_rename(library):
+    history = journal.Journal(library)
+    before = snapshot(library)
+    with history.record('Edit "dune"'):
+        library.execute("UPDATE books SET title = 'Dune' WHERE title = 'dune';")
+    after = snapshot(library)
+    assert library.execute("SELECT book_title FROM quotes;").fetchall() == [("Dune",)]
+
+    assert history.undo() == 'Edit "dune"'
+    assert snapshot(library) == before
+    assert history.redo() == 'Edit "dune"'
+    assert snapshot(library) == after
+    assert library.execute("PRAGMA foreign_key_check;").fetchall() == []
+
+
+def test_steps_are_undone_newest_first(library):
+    history = journal.Journal(library)
+    with history.record("Rate"):
+        library.execute("UPDATE books SET rating = 1 WHERE title = 'emma';")
+    with history.record("Resize"):
+        library.execute("UPDATE books SET pages = 10 WHERE title = 'emma';")
+    assert (history.undo_label(), history.redo_label()) == ("Resize", None)
+    history.undo()
+    assert (history.undo_label(), history.redo_label()) == ("Rate", "Resize")
+    history.undo()
+    assert library.execute(
+        "SELECT pages, rating FROM books WHERE title = 'emma';"
+    ).fetchone() == (300, None)
+    assert history.undo() is None
+
+
+def test_new_steps_drop_the_redo_history(library):
+    history = journal.Journal(library)
+    with history.record("Rate"):
+        library.execute("UPDATE books SET rating = 1 WHERE title = 'emma';")
+    history.undo()
+    with history.record("Resize"):
+        library.execute("UPDATE books SET pages = 10 WHERE title = 'emma';")
+    assert history.redo_label() is None
+    assert history.redo() is None
+
+
+def test_failed_steps_are_not_recorded(library):
+    history = journal.Journal(library)
+    with pytest.raises(ZeroDivisionError):
+        with history.record("Broken"):
+            library.execute("DELETE FROM books WHERE title = 'emma';")
+            raise ZeroDivisionError
+    assert history.undo_label() is None
+    assert library.execute("SELECT count(*) FROM books;").fetchone() == (2,)
+
+
+@pytest.mark.parametrize("limit", (3, journal.HISTORY_LIMIT))
+def test_history_is_trimmed_to_the_limit(library, limit):
+    history = journal.Journal(library, limit)
+    for rating in range(limit + 5):
+        with history.record(f"Rate {rating}"):
+            library.execute(
+                "UPDATE books SET rating = ? WHERE title = 'emma';", (rating % 5,)
+            )
+    steps = library.execute("SELECT count(*) FROM journal_steps;").fetchone()[0]
+    assert steps == limit
+    for _ in range(limit):
+        assert history.undo() is not None
+    assert history.undo() is None
+    # NOTE: The inverse statements of trimmed steps go along with them.
+    assert library.execute(
+        "SELECT count(*) FROM journal "
+        "WHERE step_id NOT IN (SELECT id FROM journal_steps);"
+    ).fetchone() == (0,)
+    # NOTE: The oldest step still kept is the fifth one, which set it to 4.
+    assert library.execute(
+        "SELECT rating FROM books WHERE title = 'emma';"
+    ).fetchone() == (4,)
+
+
+def test_syncing_clears_the_history(make_db, tmp_path):
+    first, second = make_db(), make_db()
+    first.execute("INSERT INTO books VALUES ('dune', 'herbert', 500, null);")
+    first.commit()
+    sync.sync_folder(first, tmp_path)
+    sync.sync_folder(second, tmp_path)
+
+    history = journal.Journal(first)
+    with history.record('Rate "dune"'):
+        first.execute("UPDATE books SET rating = 4 WHERE title = 'dune';")
+    second.execute("DELETE FROM books WHERE title = 'dune';")
+    second.execute("INSERT INTO books VALUES ('emma', 'austen', 300, null);")
+    # NOTE: Both edits can land in the same millisecond, so make sure the
+    #  delete is the later one.
+    second.execute("UPDATE row_changes SET stamp = stamp + 1000;")
+    second.commit()
+    sync.sync_folder(second, tmp_path)
+    sync.sync_folder(first, tmp_path)
+
+    assert history.undo_label() is None
+    assert history.undo() is None
+    assert first.execute("SELECT * FROM books;").fetchall() == [
+        ("emma", "austen", 300, None)
+    ]
+    assert first.execute("SELECT count(*) FROM journal;").fetchone() == (0,)
+
+
+def test_syncing_nothing_new_keeps_the_history(library, tmp_path):
+    history = journal.Journal(library)
+    with history.record('Rate "emma"'):
+        library.execute("UPDATE books SET rating = 2 WHERE title = 'emma';")
+    sync.sync_folder(library, tmp_path)
+    assert history.undo() == 'Rate "emma"'
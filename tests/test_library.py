@@ -0,0 +1,127 @@
+from datetime import date
+from itertools import product
+
+import pytest
+
+import activity
+import library
+
+PAIRS = list(product(library.SORT_ORDERS, library.GROUPINGS))
+
+# NOTE: These orders sort on values worked out from other tables (the latest
+#  day read, the share of pages read and the reading status), so no index on
+#  `books` can hold them and SQLite has to sort those rows itself. When the
+#  books are grouped by author, only the part after the author is sorted.
+TEMP_SORTS: dict[tuple[str, str], str] = {
+    **{
+        (sort_by, "Status"): "USE TEMP B-TREE FOR ORDER BY"
+        for sort_by in library.SORT_ORDERS
+    },
+    ("Last Read", "Nothing"): "USE TEMP B-TREE FOR ORDER BY",
+    ("Progress", "Nothing"): "USE TEMP B-TREE FOR ORDER BY",
+    ("Last Read", "Author"): "USE TEMP B-TREE FOR RIGHT PART OF ORDER BY",
+    ("Progress", "Author"): "USE TEMP B-TREE FOR RIGHT PART OF ORDER BY",
+}
+BOOK_INDEXES: dict[tuple[str, str], str] = {
+    ("Title", "Nothing"): "books_by_title",
+    ("Title", "Author"): "books_by_author",
+    ("Author", "Nothing"): "books_by_author",
+    ("Author", "Author"): "books_by_author",
+    ("Rating", "Nothing"): "books_by_rating",
+    ("Rating", "Author"): "books_by_author_rating",
+}
+
+
+def query_plan(connection, query):
+    return [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {query}")]
+
+
+@pytest.fixture
+def connection(make_db):
+    connection = make_db()
+    cursor = connection.cursor()
+    cursor.executemany(
+        "INSERT INTO books VALUES (?, ?, ?, ?);",
+        [
+            ("dune", "Herbert", 500, 4),
+            ("Children of Dune", "herbert", 400, 5),
+            ("emma", "Austen", 300, None),
+            ("Persuasion", "austen", 250, 3),
+        ],
+    )
+    cursor.execute("INSERT INTO ongoing_reads VALUES ('emma', '03/04/2024', 150);")
+    cursor.execute("INSERT INTO ongoing_reads VALUES ('dune', '28/12/2023', 100);")
+    cursor.execute(
+        "INSERT INTO finished_reads VALUES ('Persuasion', '01/01/2020', '02/01/2020');"
+    )
+    activity.record_activity(cursor, "dune", date(2024, 5, 1), 10)
+    activity.record_activity(cursor, "emma", date(2024, 4, 3), 10)
+    connection.commit()
+    return connection
+
+
+@pytest.mark.parametrize("sort_by,group_by", PAIRS)
+def test_books_query_plan(connection, sort_by, group_by):
+    plan = query_plan(connection, library.books_query(sort_by, group_by))
+    scans = [step for step in plan if step.startswith("SCAN")]
+    temp_sorts = [step for step in plan if "TEMP B-TREE" in step]
+    assert len(scans) == 1 and scans[0].startswith("SCAN books")
+    if (sort_by, group_by) in TEMP_SORTS:
+        assert temp_sorts == [TEMP_SORTS[sort_by, group_by]]
+    else:
+        assert temp_sorts == []
+        assert scans[0] == (
+            f"SCAN books USING COVERING INDEX {BOOK_INDEXES[sort_by, group_by]}"
+        )
+
+
+def test_ongoing_query_plan(connection):
+    assert query_plan(connection, library.ONGOING_QUERY) == [
+        "SCAN ongoing_reads USING INDEX ongoing_reads_by_start",
+        "SEARCH books USING INDEX sqlite_autoindex_books_1 (title=?)",
+    ]
+
+
+def test_every_pairing_has_a_plan():
+    assert set(TEMP_SORTS) | set(BOOK_INDEXES) == set(PAIRS)
+    assert not set(TEMP_SORTS) & set(BOOK_INDEXES)
+
+
+@pytest.mark.parametrize(
+    "sort_by,expected",
+    [
+        ("Title", ["Children of Dune", "dune", "emma", "Persuasion"]),
+        ("Author", ["emma", "Persuasion", "Children of Dune", "dune"]),
+        ("Rating", ["Children of Dune", "dune", "Persuasion", "emma"]),
+        ("Last Read", ["dune", "emma", "Children of Dune", "Persuasion"]),
+        ("Progress", ["emma", "dune", "Children of Dune", "Persuasion"]),
+    ],
+)
+def test_books_are_sorted(connection, sort_by, expected):
+    rows = library.load_books(connection.cursor(), sort_by, "Nothing")
+    assert [book.title for _, book, *_ in rows] == expected
+
+
+def test_books_are_grouped_by_status(connection):
+    rows = library.load_books(connection.cursor(), "Title", "Status")
+    assert [(group, book.title) for group, book, *_ in rows] == [
+        ("Still Reading", "dune"),
+        ("Still Reading", "emma"),
+        ("Not Started", "Children of Dune"),
+        ("Finished", "Persuasion"),
+    ]
+
+
+def test_books_are_grouped_by_author(connection):
+    rows = library.load_books(connection.cursor(), "Rating", "Author")
+    assert [(group.casefold(), book.title) for group, book, *_ in rows] == [
+        ("austen", "Persuasion"),
+        ("austen", "emma"),
+        ("herbert", "Children of Dune"),
+        ("herbert", "dune"),
+    ]
+
+
+def test_ongoing_reads_newest_first(connection):
+    rows = library.load_ongoing(connection.cursor())
+    assert [(book.title, page) for book, page in rows] == [("emma", 150), ("dune", 100)]
@@ -0,0 +1,119 @@
+import random
+from sqlite3 import connect, OperationalError
+
+import pytest
+
+import database
+import quotes
+import sync
+
+QUOTES_STEP = database.MIGRATIONS.index(quotes.setup_quotes)
+
+
+def generate_quotes(count: int, seed: int = 0) -> list[str]:
+    # NOTE: Made-up words, but with the skewed word frequencies and the mix of
+    #  one-liners and whole passages that a real quote collection has.
+    rng = random.Random(seed)
+    vocabulary = [
+        "".join(rng.choice("etaoinshrdlucmfwypvbgk") for _ in range(rng.randint(1, 9)))
+        for _ in range(3000)
+    ]
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    texts = []
+    for _ in range(count):
+        length = rng.randint(8, 60) if rng.random() < 0.6 else rng.randint(120, 600)
+        words = rng.choices(vocabulary, weights, k=length)
+        texts.append(" ".join(words).capitalize() + ".")
+    return texts
+
+
+def make_old_db(path, texts):
+    connection = connect(path)
+    connection.execute("PRAGMA foreign_keys = ON;")
+    database.create_tables(connection)
+    for step in database.MIGRATIONS[:QUOTES_STEP]:
+        step(connection)
+    connection.execute(f"PRAGMA user_version = {QUOTES_STEP};")
+    connection.executemany(
+        "INSERT INTO quotes VALUES (?, ?, '01/01/2024');",
+        ((text, f"author {index % 40}") for index, text in enumerate(texts)),
+    )
+    connection.executemany(
+        "INSERT INTO books VALUES (?, ?, 300, null);",
+        ((f"book {index}", f"author {index}") for index in range(40)),
+    )
+    connection.commit()
+    return connection
+
+
+def file_size(connection) -> int:
+    connection.execute("VACUUM;")
+    page_count = connection.execute("PRAGMA page_count;").fetchone()[0]
+    return page_count * connection.execute("PRAGMA page_size;").fetchone()[0]
+
+
+def test_generated_quotes_cover_both_layouts():
+    texts = generate_quotes(500)
+    assert len(set(texts)) == len(texts)
+    long_texts = [text for text in texts if len(text) >= quotes.COMPRESSION_THRESHOLD]
+    assert 0 < len(long_texts) < len(texts)
+
+
+def test_new_layout_is_smaller(tmp_path):
+    texts = generate_quotes(500)
+    connection = make_old_db(tmp_path / "quotes.sqlite3", texts)
+    old_size = file_size(connection)
+    database.migrate(connection)
+    new_size = file_size(connection)
+    connection.close()
+    assert new_size < old_size * 0.6
+
+
+def test_migration_keeps_every_quote(tmp_path):
+    texts = generate_quotes(200)
+    connection = make_old_db(tmp_path / "quotes.sqlite3", texts)
+    database.migrate(connection)
+    assert [text for text, _ in quotes.load_quotes(connection.cursor())] == texts
+    assert connection.execute(
+        "SELECT count(*) FROM quotes WHERE book_title IS NULL;"
+    ).fetchone() == (0,)
+    assert connection.execute("PRAGMA foreign_key_check;").fetchall() == []
+    assert all(quotes.is_saved(connection.cursor(), text) for text in texts)
+
+
+def test_failed_migration_keeps_the_old_table(tmp_path, monkeypatch):
+    texts = generate_quotes(50)
+    connection = make_old_db(tmp_path / "quotes.sqlite3", texts)
+
+    def fail(_):
+        raise OperationalError("disk I/O error")
+
+    monkeypatch.setattr(sync, "install_triggers", fail)
+    with pytest.raises(OperationalError):
+        database.migrate(connection)
+    tables = {
+        name
+        for (name,) in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table';"
+        )
+    }
+    assert "quotes_new" not in tables
+    old_quotes = connection.execute("SELECT text_ FROM quotes ORDER BY rowid;")
+    assert old_quotes.fetchall() == [(text,) for text in texts]
+    assert connection.execute("PRAGMA user_version;").fetchone() == (QUOTES_STEP,)
+
+
+def test_repeated_quotes_are_only_saved_once(make_db):
+    connection = make_db()
+    cursor = connection.cursor()
+    text = generate_quotes(1)[0]
+    assert quotes.save_quote(cursor, text, None, "someone", "01/01/2024")
+    assert not quotes.save_quote(cursor, text, None, "someone", "02/01/2024")
+    assert quotes.load_quotes(cursor) == [(text, "someone")]
+
+
+def test_long_quotes_are_compressed():
+    text = " ".join(["all work and no play makes jack a dull boy"] * 20)
+    assert type(quotes.pack_text(text)) is bytes
+    assert quotes.unpack_text(quotes.pack_text(text)) == text
+    assert quotes.pack_text("short") == "short"
@@ -0,0 +1,121 @@
+import random
+import time
+from sqlite3 import connect
+
+import pytest
+
+import database
+import search
+
+
+COMMON_WORDS = (
+    "the of and a in to my your love war house night day life man woman world "
+    "story last first king queen secret history city dark light time girl boy "
+    "death garden sea river road home heart blood fire shadow great little new "
+    "old black white red blue game lost return end"
+).split()
+
+
+def suffix(rng: random.Random, length: int = 10) -> str:
+    return "".join(rng.choice("aiouklmnprst") for _ in range(length))
+
+
+def generate_titles(count: int, seed: int = 0) -> set[str]:
+    # NOTE: Mostly common words, so that most trigrams in a title are common
+    #  ones, with made-up words mixed in.
+    rng = random.Random(seed)
+    words = [suffix(rng, rng.randint(3, 9)) for _ in range(count // 3)]
+    titles: set[str] = set()
+    while len(titles) < count:
+        titles.add(
+            " ".join(
+                rng.choice(COMMON_WORDS) if rng.random() < 0.6 else rng.choice(words)
+                for _ in range(rng.randint(1, 6))
+            ).title()
+        )
+    return titles
+
+
+@pytest.fixture
+def cursor(make_db):
+    connection = make_db()
+    rng = random.Random(0)
+    # NOTE: Enough titles with "the b" or " be" that none of the trigrams in
+    #  "the be" count as rare, but long enough not to match the queries below.
+    fillers = {
+        prefix + suffix(rng)
+        for prefix in ("the bo", "a be")
+        for _ in range(search.MAX_TRIGRAM_BOOKS + 10)
+    }
+    connection.executemany(
+        "INSERT INTO books VALUES (?, 'someone', 100, null);",
+        [(title,) for title in fillers]
+        + [("The Bec",), ("Dune",), ("Children of Dune",), ("Emma",)],
+    )
+    connection.commit()
+    return connection.cursor()
+
+
+@pytest.fixture(scope="module")
+def big_library():
+    connection = connect(":memory:")
+    database.create_tables(connection)
+    # NOTE: Adding the books before the search index exists is much faster.
+    connection.executemany(
+        "INSERT INTO books VALUES (?, 'someone', 100, null);",
+        [(title,) for title in generate_titles(100_000)],
+    )
+    database.migrate(connection)
+    yield connection
+    connection.close()
+
+
+def test_similarity_is_symmetric():
+    assert search.similarity("Dune", "dune") == 1
+    assert search.similarity("dune", "emma") == 0
+    assert search.similarity("the bex", "the bec") == search.similarity(
+        "the bec", "the bex"
+    )
+
+
+def test_exact_titles_are_found_first(cursor):
+    assert search.similar_books(cursor, "  dune ")[0] == ("Dune", "someone", 1.0)
+
+
+def test_typos_are_found(cursor):
+    titles = [title for title, *_ in search.similar_books(cursor, "Children of Dun")]
+    assert titles[0] == "Children of Dune"
+
+
+def test_short_titles_of_common_trigrams_are_found(cursor):
+    matches = search.similar_books(cursor, "the bex")
+    assert [title for title, *_ in matches] == ["The Bec"]
+
+
+def test_unrelated_titles_are_not_found(cursor):
+    assert search.similar_books(cursor, "Middlemarch") == []
+
+
+@pytest.mark.parametrize(
+    "title",
+    [
+        "The Secret History",
+        "the last king of the",
+        "Pride and Prejudice",
+        "War and Peace",
+        "the bex",
+    ],
+)
+def test_typing_stays_fast_on_a_big_library(big_library, title):
+    cursor = big_library.cursor()
+    slowest = 0.0
+    for end in range(1, len(title) + 1):
+        # NOTE: The best of a few runs, so that a busy machine doesn't fail it.
+        slowest = max(slowest, min(_time(cursor, title[:end]) for _ in range(3)))
+    assert slowest < 0.025
+
+
+def _time(cursor, title: str) -> float:
+    start = time.perf_counter()
+    search.similar_books(cursor, title)
+    return time.perf_counter() - start
@@ -0,0 +1,205 @@
+import gzip
+import json
+from datetime import date
+from pathlib import Path
+from sqlite3 import IntegrityError
+
+import pytest
+
+import activity
+import sync
+
+
+# NOTE: Far in the future, so these beat the real stamps from the setup.
+LATER = 10**14
+
+
+def set_stamp(connection, table, key, stamp):
+    connection.execute(
+        "UPDATE row_changes SET stamp = ? WHERE table_name = ? AND row_key = ?;",
+        (LATER + stamp, table, json.dumps(key)),
+    )
+    connection.commit()
+
+
+def site_id(connection):
+    return connection.execute(
+        "SELECT value FROM sync_state WHERE key = 'site_id';"
+    ).fetchone()[0]
+
+
+def books(connection):
+    return connection.execute(
+        "SELECT title, author, pages, rating FROM books ORDER BY title;"
+    ).fetchall()
+
+
+def write_changeset(folder: Path, name: str, site: str, changes) -> Path:
+    path = folder / f"{name}{sync.CHANGESET_SUFFIX}"
+    with gzip.open(path, "wt", encoding="utf8") as file:
+        json.dump(
+            {"format": sync.CHANGESET_FORMAT, "site": site, "changes": changes}, file
+        )
+    return path
+
+
+@pytest.fixture
+def sites(make_db, tmp_path):
+    first, second = make_db(), make_db()
+    first.execute("INSERT INTO books VALUES ('dune', 'herbert', 500, null);")
+    first.commit()
+    sync.sync_folder(first, tmp_path)
+    sync.sync_folder(second, tmp_path)
+    return first, second
+
+
+def test_sync_copies_new_rows(sites):
+    first, second = sites
+    assert books(second) == [("dune", "herbert", 500, None)]
+
+
+def test_merged_changes_are_not_exported_again(sites, tmp_path):
+    first, second = sites
+    changesets = sorted(tmp_path.glob(f"*{sync.CHANGESET_SUFFIX}"))
+    assert [path.name.startswith(site_id(first)) for path in changesets] == [True]
+    assert sync.sync_folder(second, tmp_path) == (0, None)
+
+
+def test_later_edit_wins(sites, tmp_path):
+    first, second = sites
+    first.execute("UPDATE books SET rating = 2 WHERE title = 'dune';")
+    second.execute("UPDATE books SET rating = 5 WHERE title = 'dune';")
+    set_stamp(first, "books", ["dune"], 1_000)
+    set_stamp(second, "books", ["dune"], 2_000)
+    sync.sync_folder(first, tmp_path)
+    sync.sync_folder(second, tmp_path)
+    sync.sync_folder(first, tmp_path)
+    assert books(first) == books(second) == [("dune", "herbert", 500, 5)]
+
+
+def test_stamp_ties_go_to_the_higher_site(sites, tmp_path):
+    first, second = sites
+    first.execute("UPDATE books SET rating = 2 WHERE title = 'dune';")
+    second.execute("UPDATE books SET rating = 5 WHERE title = 'dune';")
+    set_stamp(first, "books", ["dune"], 1_000)
+    set_stamp(second, "books", ["dune"], 1_000)
+    sync.sync_folder(first, tmp_path)
+    sync.sync_folder(second, tmp_path)
+    sync.sync_folder(first, tmp_path)
+    expected = 2 if site_id(first) > site_id(second) else 5
+    assert books(first) == books(second) == [("dune", "herbert", 500, expected)]
+
+
+def test_deletes_sync_as_tombstones(sites, tmp_path):
+    first, second = sites
+    first.execute("DELETE FROM books WHERE title = 'dune';")
+    first.commit()
+    sync.sync_folder(first, tmp_path)
+    assert sync.sync_folder(second, tmp_path)[0] == 1
+    assert books(second) == []
+
+
+def test_delete_beats_an_older_child_insert(sites, tmp_path):
+    first, second = sites
+    second.execute(
+        "INSERT INTO finished_reads VALUES ('dune', '01/01/2020', '02/01/2020');"
+    )
+    second.commit()
+    first.execute("DELETE FROM books WHERE title = 'dune';")
+    first.commit()
+    set_stamp(first, "books", ["dune"], 2_000)
+
+    sync.sync_folder(second, tmp_path)
+    sync.sync_folder(first, tmp_path)
+    sync.sync_folder(second, tmp_path)
+    for connection in (first, second):
+        assert books(connection) == []
+        assert connection.execute("SELECT * FROM finished_reads;").fetchall() == []
+        assert connection.execute("PRAGMA foreign_key_check;").fetchall() == []
+
+
+def test_rows_can_depend_on_other_changesets(make_db, tmp_path):
+    connection = make_db()
+    write_changeset(
+        tmp_path,
+        "bbbb-00000001",
+        "bbbb",
+        [
+            {
+                "table": "books",
+                "key": '["emma"]',
+                "stamp": 5,
+                "site": "bbbb",
+                "row": ["emma", "austen", 300, None],
+            }
+        ],
+    )
+    write_changeset(
+        tmp_path,
+        "aaaa-00000001",
+        "aaaa",
+        [
+            {
+                "table": "ongoing_reads",
+                "key": '["emma"]',
+                "stamp": 5,
+                "site": "aaaa",
+                "row": ["emma", "01/01/2024", 20],
+            }
+        ],
+    )
+    assert sync.sync_folder(connection, tmp_path)[0] == 2
+    assert connection.execute("SELECT * FROM ongoing_reads;").fetchall() == [
+        ("emma", "01/01/2024", 20)
+    ]
+
+
+def test_changesets_are_only_imported_once(sites, tmp_path):
+    first, second = sites
+    first.execute("UPDATE books SET pages = 10 WHERE title = 'dune';")
+    first.commit()
+    sync.sync_folder(first, tmp_path)
+    assert sync.sync_folder(second, tmp_path)[0] == 1
+    second.execute("UPDATE books SET pages = 20 WHERE title = 'dune';")
+    second.commit()
+    second.execute("UPDATE row_changes SET stamp = 0;")
+    second.commit()
+    # NOTE: Re-reading first's old changeset would now undo second's edit.
+    sync.sync_folder(second, tmp_path)
+    assert books(second) == [("dune", "herbert", 20, None)]
+
+
+def test_failed_merges_are_rolled_back(make_db, tmp_path):
+    connection = make_db()
+    path = write_changeset(
+        tmp_path,
+        "aaaa-00000001",
+        "aaaa",
+        [
+            {
+                "table": "books",
+                "key": '["emma"]',
+                "stamp": 5,
+                "site": "aaaa",
+                "row": ["emma", None, 300, None],
+            }
+        ],
+    )
+    with pytest.raises(IntegrityError):
+        sync.import_changes(connection, path)
+    assert books(connection) == []
+    assert connection.execute("SELECT * FROM imported_changesets;").fetchall() == []
+
+
+def test_pages_read_on_both_machines_add_up(sites, tmp_path):
+    first, second = sites
+    day = date(2024, 4, 3)
+    activity.record_activity(first.cursor(), "dune", day, 20)
+    activity.record_activity(second.cursor(), "dune", day, 15)
+    first.commit()
+    second.commit()
+    sync.sync_folder(first, tmp_path)
+    sync.sync_folder(second, tmp_path)
+    sync.sync_folder(first, tmp_path)
+    for connection in (first, second):
+        assert activity.daily_activity(connection.cursor()) == {2024: {day: 35}}